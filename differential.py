@@ -0,0 +1,561 @@
+import re
+import sys
+import random
+import os.path
+import tempfile
+import subprocess
+import functools
+import multiprocessing
+import xml.etree.ElementTree as ElementTree
+
+# Custom error function to print message and exit with provided return code
+def throw_error(message, code):
+    print(message, file=sys.stderr)
+    sys.exit(code)
+
+# Engine could not run the program at all, for example it does not support provided arguments
+class EngineError(Exception):
+    pass
+
+# Instructions that have label as their first argument
+label_instructions = ["LABEL", "JUMP", "CALL", "JUMPIFEQ", "JUMPIFNEQ"]
+
+# Convert IPPcode21 source code into XML representation, as parse.php would generate it
+def to_xml(source):
+    program = ElementTree.Element("program", language="IPPcode21")
+
+    order = 0
+    for line in source.split("\n"):
+        data = line.split("#", 1)[0].split()
+
+        # Header and empty lines are not part of XML representation
+        if len(data) == 0 or data[0].upper() == ".IPPCODE21":
+            continue
+
+        order = order + 1
+        instruction = ElementTree.SubElement(program, "instruction", order=str(order), opcode=data[0].upper())
+
+        for i, value in enumerate(data[1:]):
+            if i == 0 and data[0].upper() in label_instructions:
+                arg_type, arg_text = "label", value
+            elif i == 1 and data[0].upper() == "READ":
+                arg_type, arg_text = "type", value
+            else:
+                arg_type, arg_text = value.split("@", 1)
+
+                if arg_type == "GF" or arg_type == "LF" or arg_type == "TF":
+                    arg_type, arg_text = "var", value
+
+            ElementTree.SubElement(instruction, f"arg{i + 1}", type=arg_type).text = arg_text
+
+    return ElementTree.tostring(program, encoding="unicode", xml_declaration=True)
+
+# Result of single program run, everything that has to match between engines
+class Result:
+    def __init__(self, code, stdout, stats):
+        self.code = code       # Return code of interpret, None on timeout
+        self.stdout = stdout   # Everything written to standard output
+        self.stats = stats     # Content of stats file
+
+    def __eq__(self, other):
+        return self.code == other.code and self.stdout == other.stdout and self.stats == other.stats
+
+    def __str__(self):
+        return f"code {self.code}, stdout {self.stdout!r}, stats {self.stats!r}"
+
+# Run interpret on provided program and collect its result
+def run_engine(engine, source, input_data):
+    with tempfile.TemporaryDirectory() as directory:
+        file_source = os.path.join(directory, "program.src")
+        file_input = os.path.join(directory, "program.in")
+        file_stats = os.path.join(directory, "program.stats")
+
+        with open(file_source, "w") as file:
+            file.write(source if engine["format"] == "text" else to_xml(source))
+
+        with open(file_input, "w") as file:
+            file.write(input_data)
+
+        command = [sys.executable, engine["script"]] + engine["args"] + [f"--source={file_source}", f"--input={file_input}"]
+
+        # Source format argument is left out for XML, so engines that only know XML can be used too
+        if engine["format"] == "text":
+            command.append("--source-format=text")
+
+        if len(engine["stats"]) != 0:
+            command = command + [f"--stats={file_stats}"] + engine["stats"]
+
+        try:
+            process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=engine["timeout"])
+        except subprocess.TimeoutExpired:
+            return Result(None, b"", "")
+
+        # Invalid arguments would make every program look like a mismatch
+        if process.returncode == 10:
+            raise EngineError(f"Interpret '{engine['script']}' does not support arguments: {' '.join(command[2:])}")
+
+        stats = ""
+        if os.path.isfile(file_stats):
+            with open(file_stats, "r") as file:
+                stats = file.read()
+
+        return Result(process.returncode, process.stdout, stats)
+
+# Run program under both engines, return both results
+def run_both(engines, source, input_data):
+    return run_engine(engines[0], source, input_data), run_engine(engines[1], source, input_data)
+
+# Generator of random IPPcode21 programs, every generated program terminates
+class Generator:
+    # Characters that can be used in generated strings, backslash escapes are added separately
+    alphabet = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-$&%*!?"
+
+    def __init__(self, seed: int):
+        self.random = random.Random(seed)
+        self.lines = []        # Generated instructions
+        self.labels = 0        # Counter used for unique labels
+        self.functions = []    # Labels of already generated functions
+        self.depth = 0         # Nesting depth of loops and conditions
+        self.local = False     # Is generated code inside function with local frame
+        self.counters = []     # Loop counters, defined at the start of program
+
+    # Typed variables in global frame, values of these variables never change type
+    variables = {
+        "int": ["GF@i0", "GF@i1", "GF@i2", "GF@i3"],
+        "float": ["GF@f0", "GF@f1"],
+        "string": ["GF@s0", "GF@s1", "GF@s2"],
+        "bool": ["GF@b0", "GF@b1"],
+        "nil": ["GF@n0"]
+    }
+
+    # Variable that READ writes to, its type depends on input
+    read_variable = "GF@r"
+
+    # Variable for single characters and type names, so string variables keep their length
+    char_variable = "GF@c"
+
+    def emit(self, *parts):
+        self.lines.append(" ".join(parts))
+
+    def label(self, prefix):
+        self.labels = self.labels + 1
+        return f"{prefix}{self.labels}"
+
+    # Random constant of provided type in IPPcode21 notation
+    def constant(self, value_type, minimum=0):
+        if value_type == "int":
+            return f"int@{self.random.randint(-20, 20)}"
+        elif value_type == "float":
+            return f"float@{float.hex(self.random.uniform(-100, 100))}"
+        elif value_type == "bool":
+            return f"bool@{self.random.choice(['true', 'false'])}"
+        elif value_type == "nil":
+            return "nil@nil"
+
+        result = ""
+        for i in range(self.random.randint(minimum, 6)):
+            if self.random.random() < 0.15:
+                result = result + "\\" + self.random.choice(["032", "035", "092", "010", "065"])
+            else:
+                result = result + self.random.choice(self.alphabet)
+        return f"string@{result}"
+
+    # Random variable or constant of provided type
+    def symbol(self, value_type):
+        if value_type == "int" and self.local and self.random.random() < 0.3:
+            return "LF@x"
+        if self.random.random() < 0.5:
+            return self.random.choice(self.variables[value_type])
+        return self.constant(value_type)
+
+    # String that is at least as long as any index returned by index
+    def string(self):
+        if self.random.random() < 0.5:
+            return self.random.choice(self.variables["string"])
+        return self.constant("string", 3)
+
+    # Index into string, out of range only rarely
+    def index(self):
+        if self.random.random() < 0.05:
+            return self.constant("int")
+        return f"int@{self.random.randint(0, 2)}"
+
+    def variable(self, value_type):
+        if value_type == "int" and self.local and self.random.random() < 0.3:
+            return "LF@x"
+        return self.random.choice(self.variables[value_type])
+
+    # Generate single statement, might produce more instructions
+    def statement(self):
+        choice = self.random.random()
+
+        if choice < 0.02 and self.depth == 0 and not self.local:
+            self.error_path()
+        elif choice < 0.20:
+            opcode = self.random.choice(["ADD", "SUB", "MUL", "IDIV"])
+            self.emit(opcode, self.variable("int"), self.symbol("int"), self.symbol("int"))
+        elif choice < 0.28:
+            opcode = self.random.choice(["ADD", "SUB", "MUL", "DIV"])
+            self.emit(opcode, self.variable("float"), self.symbol("float"), self.symbol("float"))
+        elif choice < 0.31:
+            self.emit("INT2FLOAT", self.variable("float"), self.symbol("int"))
+        elif choice < 0.34:
+            self.emit("FLOAT2INT", self.variable("int"), self.symbol("float"))
+        elif choice < 0.44:
+            value_type = self.random.choice(["int", "float", "string", "bool"])
+            opcode = self.random.choice(["LT", "GT", "EQ"])
+            self.emit(opcode, self.variable("bool"), self.symbol(value_type), self.symbol(value_type))
+        elif choice < 0.47:
+            self.emit("EQ", self.variable("bool"), self.symbol("nil"), self.symbol(self.random.choice(["int", "string", "nil"])))
+        elif choice < 0.52:
+            opcode = self.random.choice(["AND", "OR"])
+            self.emit(opcode, self.variable("bool"), self.symbol("bool"), self.symbol("bool"))
+            self.emit("NOT", self.variable("bool"), self.symbol("bool"))
+        elif choice < 0.58:
+            self.emit("CONCAT", self.variable("string"), self.symbol("string"), self.symbol("string"))
+        elif choice < 0.61:
+            self.emit("STRLEN", self.variable("int"), self.symbol("string"))
+        elif choice < 0.64:
+            self.emit("GETCHAR", self.char_variable, self.string(), self.index())
+        elif choice < 0.66:
+            self.emit("SETCHAR", self.variable("string"), self.index(), self.constant("string", 1))
+        elif choice < 0.68:
+            self.emit("STRI2INT", self.variable("int"), self.string(), self.index())
+        elif choice < 0.70:
+            self.emit("INT2CHAR", self.char_variable, f"int@{self.random.randint(32, 126)}")
+        elif choice < 0.72:
+            self.emit("TYPE", self.char_variable, self.symbol(self.random.choice(list(self.variables))))
+        elif choice < 0.80:
+            self.emit("WRITE", self.symbol(self.random.choice(list(self.variables))))
+        elif choice < 0.83:
+            value_type = self.random.choice(list(self.variables))
+            self.emit("PUSHS", self.symbol(value_type))
+            self.emit("POPS", self.variable(value_type))
+        elif choice < 0.85:
+            value_type = self.random.choice(["int", "float", "string", "bool"])
+            self.emit("READ", self.read_variable, value_type)
+            self.emit("TYPE", self.char_variable, self.read_variable)
+            self.emit("WRITE", self.read_variable)
+        elif choice < 0.90 and len(self.functions) > 0:
+            self.emit("CREATEFRAME")
+            self.emit("CALL", self.random.choice(self.functions))
+        elif choice < 0.95 and self.depth < 2:
+            self.loop()
+        elif self.depth < 2:
+            self.condition()
+        else:
+            self.emit("WRITE", self.symbol("string"))
+
+    # Deliberately broken code, exercises error handling of engines
+    def error_path(self):
+        choice = self.random.randint(0, 7)
+
+        if choice == 0:
+            self.emit("EXIT", f"int@{self.random.randint(0, 49)}")
+        elif choice == 1:
+            self.emit("ADD", self.variable("int"), self.symbol("int"), self.symbol("string"))
+        elif choice == 2:
+            self.emit("WRITE", "GF@undefined")
+        elif choice == 3:
+            self.emit("POPFRAME")
+        elif choice == 4:
+            self.emit("RETURN")
+        elif choice == 5:
+            self.emit("POPS", self.variable("int"))
+        elif choice == 6:
+            self.emit("IDIV", self.variable("int"), self.symbol("int"), "int@0")
+        elif choice == 7:
+            self.emit("EXIT", f"int@{self.random.randint(50, 60)}")
+
+    # Bounded loop with its own counter that is never written by loop body
+    def loop(self):
+        label = self.label("loop")
+        counter = f"GF@{label}"
+
+        self.depth = self.depth + 1
+        self.counters.append(counter)
+        self.emit("MOVE", counter, "int@0")
+        self.emit("LABEL", label)
+        for i in range(self.random.randint(1, 4)):
+            self.statement()
+        self.emit("ADD", counter, counter, "int@1")
+        self.emit("JUMPIFNEQ", label, counter, f"int@{self.random.randint(1, 5)}")
+        self.depth = self.depth - 1
+
+    # Forward conditional jump over few statements
+    def condition(self):
+        label = self.label("skip")
+        value_type = self.random.choice(["int", "string", "bool", "nil"])
+
+        self.depth = self.depth + 1
+        self.emit(self.random.choice(["JUMPIFEQ", "JUMPIFNEQ"]), label, self.symbol(value_type), self.symbol(value_type))
+        for i in range(self.random.randint(1, 3)):
+            self.statement()
+        self.emit("LABEL", label)
+        self.depth = self.depth - 1
+
+    # Function that works with its own local frame, it can only call functions generated before it
+    def function(self):
+        label = self.label("function")
+
+        self.emit("LABEL", label)
+        self.emit("PUSHFRAME")
+        self.emit("DEFVAR", "LF@x")
+        self.emit("MOVE", "LF@x", self.constant("int"))
+        self.local = True
+        for i in range(self.random.randint(1, 6)):
+            self.statement()
+        self.local = False
+        self.emit("WRITE", "LF@x")
+        self.emit("POPFRAME")
+        self.emit("RETURN")
+
+        self.functions.append(label)
+
+    # Generate whole program and its input
+    def program(self):
+        self.emit("JUMP", "main")
+        for i in range(self.random.randint(0, 3)):
+            self.function()
+
+        self.emit("LABEL", "main")
+        for i in range(self.random.randint(10, 40)):
+            self.statement()
+
+        # Variables are defined in prologue, so loops and functions never redefine them
+        body = self.lines
+        self.lines = []
+        for value_type, names in self.variables.items():
+            for name in names:
+                self.emit("DEFVAR", name)
+                self.emit("MOVE", name, self.constant(value_type, 3))
+
+        for name in [self.read_variable, self.char_variable] + self.counters:
+            self.emit("DEFVAR", name)
+
+        input_lines = [self.constant(self.random.choice(["int", "string", "bool"])).split("@", 1)[1] for i in range(self.random.randint(0, 5))]
+        return self.lines + body, "\n".join(input_lines)
+
+# Join instruction lines into IPPcode21 source code
+def build_source(lines):
+    return ".IPPcode21\n" + "\n".join(lines) + "\n"
+
+# Check single seed, return seed if engines do not match
+def check_seed(engines, seed):
+    lines, input_data = Generator(seed).program()
+    result_reference, result_candidate = run_both(engines, build_source(lines), input_data)
+
+    if result_reference != result_candidate:
+        return seed
+
+    return None
+
+# Remove as many instructions as possible while engines still do not match (delta debugging)
+def shrink(engines, lines, input_data):
+    chunk = len(lines) // 2
+
+    while chunk > 0:
+        i = 0
+        removed = False
+
+        while i < len(lines):
+            attempt = lines[:i] + lines[i + chunk:]
+            result_reference, result_candidate = run_both(engines, build_source(attempt), input_data)
+
+            if result_reference != result_candidate:
+                lines = attempt
+                removed = True
+            else:
+                i = i + chunk
+
+        if not removed:
+            chunk = chunk // 2
+
+    return lines
+
+# Shrink mismatching seed into minimal program
+def reproduce(engines, seed):
+    lines, input_data = Generator(seed).program()
+    lines = shrink(engines, lines, input_data)
+    return seed, build_source(lines), input_data
+
+# Program whose result differs if quickened ADD computes something else than generic ADD
+self_test_source = """.IPPcode21
+DEFVAR GF@i
+MOVE GF@i int@0
+LABEL loop
+ADD GF@i GF@i int@1
+JUMPIFNEQ loop GF@i int@5
+WRITE GF@i
+"""
+
+# Plant bug into quickened ADD of default interpret and check that default engines tell quickened and generic execution apart
+def self_test(engines):
+    with open(interpret, "r") as file:
+        code = file.read()
+
+    planted = re.sub(r'("ADD":\s*\(\[int, float\], operator\.)add\)', r"\1sub)", code)
+    if planted == code:
+        throw_error(f"Could not find quickened ADD in '{interpret}'", 1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        script = os.path.join(directory, "interpret.py")
+        with open(script, "w") as file:
+            file.write(planted)
+
+        result_reference, result_candidate = run_both([dict(engine, script=script) for engine in engines], self_test_source, "")
+
+    if result_reference == result_candidate:
+        print(f"Self test failed, bug in quickened ADD was not detected\n  reference: {result_reference}\n  candidate: {result_candidate}")
+        sys.exit(1)
+
+    print("Self test passed")
+    sys.exit(0)
+
+# Compare engines on provided program or on generated programs
+def run(engines):
+    if self_check:
+        self_test(engines)
+
+    # Compare engines on single provided program
+    if file_source != None:
+        with open(file_source, "r") as file:
+            source = file.read()
+
+        input_data = ""
+        if file_input != None:
+            with open(file_input, "r") as file:
+                input_data = file.read()
+
+        result_reference, result_candidate = run_both(engines, source, input_data)
+
+        if result_reference != result_candidate:
+            print(f"Mismatch\n  reference: {result_reference}\n  candidate: {result_candidate}")
+            sys.exit(1)
+
+        print(f"Match: {result_reference}")
+        sys.exit(0)
+
+    # Compare engines on generated programs, then shrink every mismatch in parallel
+    with multiprocessing.Pool(jobs) as pool:
+        mismatches = sorted(seed for seed in pool.imap_unordered(functools.partial(check_seed, engines), range(seed_start, seed_start + seeds)) if seed != None)
+        reproducers = pool.map(functools.partial(reproduce, engines), mismatches)
+
+    for seed, source, input_data in reproducers:
+        result_reference, result_candidate = run_both(engines, source, input_data)
+
+        print(f"Mismatch in seed {seed}\n  reference: {result_reference}\n  candidate: {result_candidate}")
+        print(source)
+
+        if directory_output != None:
+            with open(os.path.join(directory_output, f"seed{seed}.src"), "w") as file:
+                file.write(source)
+
+            with open(os.path.join(directory_output, f"seed{seed}.in"), "w") as file:
+                file.write(input_data)
+
+    print(f"Checked {seeds} programs, {len(mismatches)} mismatches")
+    sys.exit(1 if len(mismatches) != 0 else 0)
+
+# Parse command line arguments
+file_source = None
+file_input = None
+directory_output = None
+seeds = None
+self_check = False
+seed_start = 0
+jobs = None
+
+# Was reference interpret provided, default interpret.py runs without quickening as reference semantics of instructions
+reference_custom = False
+
+# Default interpret is the one next to this script, so the tool can be run from any directory
+interpret = os.path.join(os.path.dirname(os.path.abspath(__file__)), "interpret.py")
+
+# Engines are run with source format, compared stats and maximum time in seconds they can spend on a single program
+reference = {"script": interpret, "args": [], "format": "xml", "stats": ["--insts", "--hot", "--vars"], "timeout": 2}
+candidate = {"script": interpret, "args": [], "format": "xml", "stats": ["--insts", "--hot", "--vars"], "timeout": 2}
+
+if __name__ == "__main__":
+    for arg in sys.argv[1:]:
+        if arg == "--help" and len(sys.argv[1:]) == 1:
+            print("--help - List differential testing parameters\n")
+            print("--reference=file - Interpret used as reference, defaults to interpret.py run with --no-quicken")
+            print("--reference-arg=arg - Additional argument passed to reference interpret, can be repeated")
+            print("--reference-format=xml|text - Source format passed to reference interpret, defaults to xml")
+            print("--candidate=file - Interpret that is compared to reference, defaults to interpret.py")
+            print("--candidate-arg=arg - Additional argument passed to compared interpret, can be repeated")
+            print("--candidate-format=xml|text - Source format passed to compared interpret, defaults to xml")
+            print("--compare-stats=names - Comma separated stats that are compared, defaults to insts,hot,vars\n")
+            print("--source=file - Compare engines on provided IPPcode21 source code")
+            print("--input=file - Input file for provided source code\n")
+            print("--seeds=count - Compare engines on given number of generated programs")
+            print("--start=seed - First seed of generated programs, defaults to 0")
+            print("--jobs=count - Number of programs checked in parallel, defaults to number of CPUs")
+            print("--timeout=seconds - Maximum run time of single program, defaults to 2")
+            print("--output=directory - Save shrunk reproducers of mismatches to directory\n")
+            print("--self-test - Check that default engines detect bug planted into quickened instructions")
+            sys.exit(0)
+        elif re.match(r"^--reference=(\S+)$", arg):
+            reference["script"] = re.match(r"^--reference=(\S+)$", arg).groups()[0]
+            reference_custom = True
+        elif re.match(r"^--reference-arg=(\S+)$", arg):
+            reference["args"].append(re.match(r"^--reference-arg=(\S+)$", arg).groups()[0])
+        elif re.match(r"^--reference-format=(xml|text)$", arg):
+            reference["format"] = re.match(r"^--reference-format=(xml|text)$", arg).groups()[0]
+        elif re.match(r"^--candidate-format=(xml|text)$", arg):
+            candidate["format"] = re.match(r"^--candidate-format=(xml|text)$", arg).groups()[0]
+        elif re.match(r"^--compare-stats=([a-z]+(?:,[a-z]+)*)?$", arg):
+            names = re.match(r"^--compare-stats=([a-z]+(?:,[a-z]+)*)?$", arg).groups()[0]
+            reference["stats"] = candidate["stats"] = [f"--{name}" for name in names.split(",")] if names else []
+        elif re.match(r"^--candidate=(\S+)$", arg):
+            candidate["script"] = re.match(r"^--candidate=(\S+)$", arg).groups()[0]
+        elif re.match(r"^--candidate-arg=(\S+)$", arg):
+            candidate["args"].append(re.match(r"^--candidate-arg=(\S+)$", arg).groups()[0])
+        elif re.match(r"^--source=(\S+)$", arg) and file_source == None and seeds == None and not self_check:
+            file_source = re.match(r"^--source=(\S+)$", arg).groups()[0]
+        elif re.match(r"^--input=(\S+)$", arg) and file_input == None:
+            file_input = re.match(r"^--input=(\S+)$", arg).groups()[0]
+        elif re.match(r"^--seeds=(\d+)$", arg) and seeds == None and file_source == None and not self_check:
+            seeds = int(re.match(r"^--seeds=(\d+)$", arg).groups()[0])
+        elif arg == "--self-test" and seeds == None and file_source == None:
+            self_check = True
+        elif re.match(r"^--start=(\d+)$", arg):
+            seed_start = int(re.match(r"^--start=(\d+)$", arg).groups()[0])
+        elif re.match(r"^--jobs=([1-9]\d*)$", arg):
+            jobs = int(re.match(r"^--jobs=([1-9]\d*)$", arg).groups()[0])
+        elif re.match(r"^--timeout=([1-9]\d*)$", arg):
+            reference["timeout"] = candidate["timeout"] = int(re.match(r"^--timeout=([1-9]\d*)$", arg).groups()[0])
+        elif re.match(r"^--output=(\S+)$", arg):
+            directory_output = re.match(r"^--output=(\S+)$", arg).groups()[0]
+        else:
+            throw_error("Unknown argument or invalid combination of arguments [1]", 10)
+
+    # Either single program or number of generated programs has to be provided
+    if file_source == None and seeds == None and not self_check:
+        throw_error("Unknown argument or invalid combination of arguments [2]", 10)
+
+    # Self test plants bug into default interpret, so it can not be combined with other engines
+    if self_check and (reference_custom or candidate["script"] != interpret):
+        throw_error("Unknown argument or invalid combination of arguments [4]", 10)
+
+    if file_input != None and file_source == None:
+        throw_error("Unknown argument or invalid combination of arguments [3]", 10)
+
+    for path in [reference["script"], candidate["script"], file_source, file_input]:
+        if path != None and not os.path.isfile(path):
+            throw_error(f"File '{path}' does not exist", 11)
+
+    if directory_output != None and not os.path.isdir(directory_output):
+        throw_error(f"Directory '{directory_output}' does not exist", 11)
+
+    # Other reference interprets do not have to support --no-quicken
+    if not reference_custom:
+        reference["args"].insert(0, "--no-quicken")
+
+    engines = (reference, candidate)
+
+    try:
+        run(engines)
+    except EngineError as error:
+        throw_error(str(error), 10)
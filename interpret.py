@@ -1,6 +1,11 @@
 import re
 import sys
+import array
+import atexit
+import struct
 import argparse
+import operator
+import itertools
 import os.path
 import xml.etree.ElementTree as ElementTree
 
@@ -27,6 +32,19 @@ def is_string_int(string):
     except:
         return False
 
+# Convert value to its textual form used by WRITE
+def value_to_string(value):
+    if value == None:
+        return ""
+
+    if type(value) == bool:
+        return "true" if value else "false"
+
+    if type(value) == float:
+        return float.hex(value)
+
+    return str(value)
+
 # Custom type for working with undefined values
 class VarState(Enum):
     UNDEFINED = 1
@@ -102,6 +120,19 @@ instruction_table = {
     "BREAK":        []
 }
 
+# Instructions that can be specialized for type of their operands, types they can be specialized for and specialized operation
+quickening_table = {
+    "ADD":          ([int, float], operator.add),
+    "SUB":          ([int, float], operator.sub),
+    "MUL":          ([int, float], operator.mul),
+    "LT":           ([int, bool, str, float], operator.lt),
+    "GT":           ([int, bool, str, float], operator.gt),
+    "EQ":           ([int, bool, str, float], operator.eq),
+    "CONCAT":       ([str], operator.add),
+    "JUMPIFEQ":     ([int, bool, str, float], operator.eq),
+    "JUMPIFNEQ":    ([int, bool, str, float], operator.ne)
+}
+
 # Instruction instance
 class Instruction:
     def __init__(self, name: str, order: int):
@@ -109,17 +140,199 @@ class Instruction:
         self.order = order     # Order of instruction
         self.arguments = []    # Arguments of instruction
         self.calls = 0         # How many times was the instruction called
-
+        self.quick = None      # Specialized implementation for type of operands, see quickening_table
 
 class Variable: 
     def __init__(self, frame: FrameType, name: str):
         self.frame = frame     # What frame is the variable referring to
         self.name = name       # Identifier of variable
 
+# Binary ring buffer of executed instructions, entries are kept in memory and written to file in blocks
+class Trace:
+    # File header: magic, version, flags, capacity in entries and total number of recorded entries
+    header = struct.Struct("<4sHHIQ")
+    magic = b"IPPT"
+    version = 2
+
+    # Entry of trace with value log: index, value tag and value payload, without value log entry is only the index
+    entry = struct.Struct("<IBq")
+
+    # Header flags marking that value log is present and that program was loaded with debug instructions
+    flag_values = 1
+    flag_debug = 2
+
+    # Bit of index entry marking that conditional jump was taken
+    bit_taken = 0x80000000
+
+    # Maximum number of entries written to file at once
+    block = 65536
+
+    # Tags of values in value log
+    tag_none = 0
+    tag_int = 1
+    tag_float = 2
+    tag_bool = 3
+    tag_nil = 4
+    tag_string = 5
+
+    def __init__(self, filename: str, capacity: int, values: bool, debug: bool):
+        self.capacity = capacity       # Maximum number of entries kept in file
+        self.values = values           # Is value log recorded
+        self.debug = debug             # Were debug instructions kept in program
+
+        # Buffer never holds more entries than file can keep
+        self.block = min(self.block, capacity)
+
+        self.total = 0                 # Number of entries recorded so far
+        self.indexes = array.array("I")
+        self.tags = bytearray()
+        self.payloads = array.array("q")
+
+        try:
+            self.file = open(filename, "wb")
+        except:
+            throw_error(f"Could not open file '{filename}'", 12)
+
+        self.write_header()
+
+    def write_header(self):
+        self.file.seek(0)
+        flags = (self.flag_values if self.values else 0) | (self.flag_debug if self.debug else 0)
+        self.file.write(self.header.pack(self.magic, self.version, flags, self.capacity, self.total))
+
+    # Record index of instruction that is being executed
+    def record(self, index: int):
+        if len(self.indexes) == self.block:
+            self.flush()
+
+        self.indexes.append(index)
+        self.total = self.total + 1
+
+        if self.values:
+            self.tags.append(self.tag_none)
+            self.payloads.append(0)
+
+    # Mark last recorded conditional jump as taken
+    def taken(self):
+        self.indexes[-1] |= self.bit_taken
+
+    # Save value produced by last recorded instruction
+    def value(self, value):
+        if type(value) == int:
+            self.tags[-1] = self.tag_int
+            self.payloads[-1] = max(-2 ** 63, min(2 ** 63 - 1, value))
+        elif type(value) == float:
+            self.tags[-1] = self.tag_float
+            self.payloads[-1] = struct.unpack("<q", struct.pack("<d", value))[0]
+        elif type(value) == bool:
+            self.tags[-1] = self.tag_bool
+            self.payloads[-1] = int(value)
+        elif type(value) == type(None):
+            self.tags[-1] = self.tag_nil
+        elif type(value) == str:
+            self.tags[-1] = self.tag_string
+            self.payloads[-1] = len(value)
+
+    # Write buffered entries to their slots in file, older entries are overwritten once capacity is reached
+    def flush(self):
+        if self.values:
+            size = self.entry.size
+            data = b"".join(map(self.entry.pack, self.indexes, self.tags, self.payloads))
+        else:
+            size = self.indexes.itemsize
+            data = self.indexes.tobytes()
+
+        # Entries that do not fit before the end of file wrap around to its beginning
+        slot = (self.total - len(self.indexes)) % self.capacity
+        split = (self.capacity - slot) * size
+
+        self.file.seek(self.header.size + slot * size)
+        self.file.write(data[:split])
+
+        if len(data) > split:
+            self.file.seek(self.header.size)
+            self.file.write(data[split:])
+
+        self.indexes = array.array("I")
+        self.tags = bytearray()
+        self.payloads = array.array("q")
+
+    def close(self):
+        self.flush()
+        self.write_header()
+        self.file.close()
+
+    # Read trace file and print recorded entries from oldest to newest
+    @classmethod
+    def decode(cls, filename: str, instructions, debug: bool):
+        try:
+            with open(filename, "rb") as file:
+                data = file.read()
+            magic, version, flags, capacity, total = cls.header.unpack_from(data)
+        except:
+            throw_error(f"Could not read trace file '{filename}'", 11)
+
+        if magic != cls.magic or version != cls.version:
+            throw_error(f"File '{filename}' is not a trace file", 11)
+
+        # Indexes of instructions differ if debug instructions were stripped from only one of the programs
+        if bool(flags & cls.flag_debug) != debug:
+            throw_error(f"Trace file '{filename}' was recorded {'with' if flags & cls.flag_debug else 'without'} --debug, decode it the same way", 11)
+
+        # Oldest entry is right after the newest one if buffer wrapped around
+        count = min(total, capacity)
+        first = total % capacity if total > capacity else 0
+
+        data = data[cls.header.size:]
+        if flags & cls.flag_values:
+            entries = list(cls.entry.iter_unpack(data[:count * cls.entry.size]))
+        else:
+            entries = [(index, cls.tag_none, 0) for index in array.array("I", data[:count * 4])]
+
+        if len(entries) != count:
+            throw_error(f"Trace file '{filename}' is truncated", 11)
+
+        for i in range(count):
+            raw_index, tag, payload = entries[(first + i) % capacity]
+            index = raw_index & ~cls.bit_taken
+
+            if index >= len(instructions):
+                throw_error(f"Trace file '{filename}' does not match provided source file", 11)
+
+            instruction = instructions[index]
+
+            line = f"{total - count + i} {instruction.order} {instruction.name}"
+
+            if instruction.name == "JUMPIFEQ" or instruction.name == "JUMPIFNEQ":
+                line = line + (" taken" if raw_index & cls.bit_taken else " not-taken")
+
+            if flags & cls.flag_values:
+                if tag == cls.tag_int:
+                    line = line + f" int@{payload}"
+                elif tag == cls.tag_float:
+                    line = line + f" float@{float.hex(struct.unpack('<d', struct.pack('<q', payload))[0])}"
+                elif tag == cls.tag_bool:
+                    line = line + (" bool@true" if payload else " bool@false")
+                elif tag == cls.tag_nil:
+                    line = line + " nil@nil"
+                elif tag == cls.tag_string:
+                    line = line + f" string({payload})"
+
+            print(line)
+
 # Parse command line arguments
 file_source = None
 file_input = None
 file_stats = None
+source_format = None
+file_trace = None
+file_trace_decode = None
+trace_size = None
+trace_values = False
+max_memory = None
+debug = False
+quickening = True
+pipeline = False
 
 # Requested stats
 stats = []
@@ -128,24 +341,66 @@ for arg in sys.argv[1:]:
     if arg == "--help" and len(sys.argv[1:]) == 1:
         print("--help - List interpret parameters\n")
         print("--source=file - Set source file")
-        print("--input=file - Set input file\n")
+        print("--input=file - Set input file")
+        print("--source-format=xml|text - Format of source file, XML representation (default) or IPPcode21 source code\n")
         print("--stats=file - Target file for stats")
         print("--insts - Save number of called instructions to stats")
         print("--vars - Save maximum number of initialized variables to stats")
         print("--hot - Save order of instruction that was called the most to stats")
+        print("--stack - Save maximum depth of data stack to stats")
+        print("--calls - Save maximum depth of call stack to stats")
+        print("--frames - Save maximum depth of local frames stack to stats")
+        print("--strings - Save maximum number of UTF-8 bytes taken by strings in variables to stats")
+        print("--largest - Save size in bytes of the largest value stored in variable or data stack to stats\n")
+        print("--debug - Execute DPRINT and BREAK instructions, otherwise they are removed when program is loaded")
+        print("--pipeline - Start execution while the rest of program is still being loaded, undefined labels are reported when used and instructions out of order when loaded")
+        print("--no-quicken - Do not specialize instructions for type of their operands, always check types")
+        print("--max-memory=bytes - Exit with code 59 if strings in variables and values on data stack take more bytes\n")
+        print("--trace=file - Record executed instructions and jump outcomes to binary trace file")
+        print("--trace-size=entries - Maximum number of entries kept in trace file, oldest are overwritten")
+        print("--trace-values - Record values written by instructions to trace file")
+        print("--decode-trace=file - Print trace file recorded for provided source file, --debug must match recording")
         sys.exit(0)
     elif re.match(r"^--source=(\S+)$", arg) and file_source == None:
         file_source = re.match(r"^--source=(\S+)$", arg).groups()[0]
     elif re.match(r"^--input=(\S+)$", arg) and file_input == None:
         file_input = re.match(r"^--input=(\S+)$", arg).groups()[0]
+    elif re.match(r"^--source-format=(xml|text)$", arg) and source_format == None:
+        source_format = re.match(r"^--source-format=(xml|text)$", arg).groups()[0]
     elif re.match(r"^--stats=(\S+)$", arg) and file_stats == None:
         file_stats = re.match(r"^--stats=(\S+)$", arg).groups()[0]
+    elif re.match(r"^--trace=(\S+)$", arg) and file_trace == None and file_trace_decode == None:
+        file_trace = re.match(r"^--trace=(\S+)$", arg).groups()[0]
+    elif re.match(r"^--trace-size=([1-9]\d*)$", arg) and trace_size == None:
+        trace_size = int(re.match(r"^--trace-size=([1-9]\d*)$", arg).groups()[0])
+    elif arg == "--trace-values":
+        trace_values = True
+    elif re.match(r"^--decode-trace=(\S+)$", arg) and file_trace_decode == None and file_trace == None:
+        file_trace_decode = re.match(r"^--decode-trace=(\S+)$", arg).groups()[0]
     elif arg == "--insts":
         stats.append("insts")
     elif arg == "--vars":
         stats.append("vars")
     elif arg == "--hot":
         stats.append("hot")
+    elif arg == "--stack":
+        stats.append("stack")
+    elif arg == "--calls":
+        stats.append("calls")
+    elif arg == "--frames":
+        stats.append("frames")
+    elif arg == "--strings":
+        stats.append("strings")
+    elif arg == "--largest":
+        stats.append("largest")
+    elif arg == "--debug":
+        debug = True
+    elif arg == "--no-quicken":
+        quickening = False
+    elif arg == "--pipeline":
+        pipeline = True
+    elif re.match(r"^--max-memory=([1-9]\d*)$", arg) and max_memory == None:
+        max_memory = int(re.match(r"^--max-memory=([1-9]\d*)$", arg).groups()[0])
     else:
         throw_error("Unknown argument or invalid combination of arguments [1]", 10)
 
@@ -156,6 +411,12 @@ if file_input == None and file_source == None:
 if file_stats == None and len(stats) != 0:
     throw_error("Unknown argument or invalid combination of arguments [3]", 10)
 
+if file_trace == None and (trace_size != None or trace_values):
+    throw_error("Unknown argument or invalid combination of arguments [4]", 10)
+
+if file_trace_decode != None and pipeline:
+    throw_error("Unknown argument or invalid combination of arguments [5]", 10)
+
 # Check if provided file in source argument exists
 if file_source and not os.path.isfile(file_source):
     throw_error(f"File '{file_source}' does not exist", 11)
@@ -164,19 +425,9 @@ if file_source and not os.path.isfile(file_source):
 if file_input and not os.path.isfile(file_input):
     throw_error(f"File '{file_input}' does not exist", 11)
 
-# Parse input source file and check if it is well-formed
-try:
-    file_parsed = ElementTree.parse(file_source if file_source else sys.stdin)
-except:
-    throw_error(f"Input source file is not well-formed", 31)
-
-root = file_parsed.getroot()
-if root.tag != "program" or "language" not in root.attrib or root.attrib["language"].lower() != "ippcode21":
-    throw_error(f"Input source file has unknown structure [1]", 32)
-
-# Redirect input file to stdin if provided
-if file_input:
-    sys.stdin = open(file_input, "r")
+# Check if provided trace file that should be decoded exists
+if file_trace_decode and not os.path.isfile(file_trace_decode):
+    throw_error(f"File '{file_trace_decode}' does not exist", 11)
 
 # List of all parsed instructions
 instructions = []
@@ -184,25 +435,67 @@ instructions = []
 # List of all parsed labels
 labels = {}
 
-# Save last parsed order of instruction so we can check there are no instructions with same order
-last_order = 0
+# Decode lexical representation of argument, exit with provided code if it does not match required type
+def decode_argument(required: ArgumentType, arg_type: str, arg_text: str, message: str, code: int):
+    if (required == ArgumentType.VAR or required == ArgumentType.SYMB) and arg_type == "var" and re.match(r"^(GF|LF|TF)@[a-zA-Z_\-$&%*!?]+[a-zA-Z_\-$&%*!?0-9]*$", arg_text) != None:
+        frame, name = arg_text.split("@", 1)
+
+        frame_type = None
+        if frame == "GF":
+            frame_type = FrameType.GLOBAL
+        elif frame == "LF":
+            frame_type = FrameType.LOCAL
+        elif frame == "TF":
+            frame_type = FrameType.TEMPORARY
+        return Variable(frame_type, name)
+    elif required == ArgumentType.SYMB and arg_type == "string" and re.match(r"^((\x5C[0-9]{3})|[^#\s\x5C])*$", arg_text):
+        for escape in re.findall(r'\\\d\d\d', arg_text):
+            arg_text = arg_text.replace(escape, chr(int(escape[1:])))
+        return arg_text
+    elif required == ArgumentType.LABEL and arg_type == "label" and re.match(r"^[a-zA-Z_\-$&%*!?]+[a-zA-Z_\-$&%*!?0-9]*$", arg_text) != None:
+        return arg_text
+    elif required == ArgumentType.TYPE and arg_type == "type" and re.match(r"^(int|string|bool|float)$", arg_text) != None:
+        if arg_text == "int":
+            return Type.INT
+        elif arg_text == "string":
+            return Type.STRING
+        elif arg_text == "bool":
+            return Type.BOOL
+        elif arg_text == "float":
+            return Type.FLOAT
+    elif required == ArgumentType.SYMB and arg_type == "bool" and re.match(r"^(true|false)$", arg_text) != None:
+        return arg_text == "true"
+    elif required == ArgumentType.SYMB and arg_type == "float" and is_hexstring_float(arg_text):
+        return float.fromhex(arg_text)
+    elif required == ArgumentType.SYMB and arg_type == "int" and is_string_int(arg_text):
+        return int(arg_text)
+    elif required == ArgumentType.SYMB and arg_type == "nil" and arg_text == "nil":
+        return None
+
+    throw_error(message, code)
+
+# Save parsed instruction and position of label it defines
+def add_instruction(instruction: Instruction):
+    # Debug instructions are left out of executed program unless debugging is enabled
+    if not debug and (instruction.name == "DPRINT" or instruction.name == "BREAK"):
+        return
 
-instruction_elements = sorted(root, key=lambda x: int(x.attrib["order"]) if "order" in x.attrib and x.attrib["order"].isdigit() else 0)
-for instruction_i, elem_instruction in enumerate(instruction_elements):
-    # Verify that instruction element has correct attributes
-    if elem_instruction.tag != "instruction" or "order" not in elem_instruction.attrib or not is_string_int(elem_instruction.attrib["order"]) or "opcode" not in elem_instruction.attrib:
-        throw_error(f"Input source file has unknown structure [2]", 32)
+    # Labels need to be unique
+    if instruction.name == "LABEL":
+        if instruction.arguments[0] in labels:
+            throw_error(f"Label '{instruction.arguments[0]}' already exists", 52)
 
-    order = int(elem_instruction.attrib["order"])
-    opcode = elem_instruction.attrib["opcode"]
+        labels[instruction.arguments[0]] = len(instructions)
 
-    # Order needs to be bigger than 0 and there can't be two instructions with same order
-    if order < 1 or order == last_order:
-        throw_error(f"Input source file has unknown structure [3]", 32)
+    instructions.append(instruction)
 
-    last_order = order
+# Decode instruction element of XML representation
+def decode_instruction(elem_instruction):
+    # Verify that instruction element has correct attributes
+    if elem_instruction.tag != "instruction" or "order" not in elem_instruction.attrib or not is_string_int(elem_instruction.attrib["order"]) or "opcode" not in elem_instruction.attrib:
+        throw_error(f"Input source file has unknown structure [2]", 32)
 
-    instruction = Instruction(opcode.upper(), order)
+    instruction = Instruction(elem_instruction.attrib["opcode"].upper(), int(elem_instruction.attrib["order"]))
 
     if instruction.name not in instruction_table:
         throw_error(f"Undefined instruction {instruction.name}", 32)
@@ -227,61 +520,226 @@ for instruction_i, elem_instruction in enumerate(instruction_elements):
         arg_text = elem_arg.text if elem_arg.text != None else ""
 
         required = instruction_table[instruction.name][index]
+        instruction.arguments.append(decode_argument(required, arg_type, arg_text, "Input source file has unknown structure [7]", 32))
 
-        if (required == ArgumentType.VAR or required == ArgumentType.SYMB) and arg_type == "var" and re.match(r"^(GF|LF|TF)@[a-zA-Z_\-$&%*!?]+[a-zA-Z_\-$&%*!?0-9]*$", arg_text) != None:
-            frame, name = arg_text.split("@", 1)
-
-            frame_type = None
-            if frame == "GF":
-                frame_type = FrameType.GLOBAL
-            elif frame == "LF":
-                frame_type = FrameType.LOCAL
-            elif frame == "TF":
-                frame_type = FrameType.TEMPORARY
-            instruction.arguments.append(Variable(frame_type, name))
-        elif required == ArgumentType.SYMB and arg_type == "string" and re.match(r"^((\x5C[0-9]{3})|[^#\s\x5C])*$", arg_text):
-            for code in re.findall(r'\\\d\d\d', arg_text):
-                arg_text = arg_text.replace(code, chr(int(code[1:])))
-            instruction.arguments.append(arg_text)
-        elif required == ArgumentType.LABEL and arg_type == "label" and re.match(r"^[a-zA-Z_\-$&%*!?]+[a-zA-Z_\-$&%*!?0-9]*$", arg_text) != None:
-            instruction.arguments.append(arg_text)
-        elif required == ArgumentType.TYPE and arg_type == "type" and re.match(r"^(int|string|bool|float)$", arg_text) != None:
-            if arg_text == "int":
-                instruction.arguments.append(Type.INT)
-            elif arg_text == "string":
-                instruction.arguments.append(Type.STRING)
-            elif arg_text == "bool":
-                instruction.arguments.append(Type.BOOL)
-            elif arg_text == "float":
-                instruction.arguments.append(Type.FLOAT)
-        elif required == ArgumentType.SYMB and arg_type == "bool" and re.match(r"^(true|false)$", arg_text) != None:
-            if arg_text == "true":
-                instruction.arguments.append(True)
-            elif arg_text == "false":
-                instruction.arguments.append(False)
-        elif required == ArgumentType.SYMB and arg_type == "float" and is_hexstring_float(arg_text):
-            instruction.arguments.append(float.fromhex(arg_text))
-        elif required == ArgumentType.SYMB and arg_type == "int" and is_string_int(arg_text):
-            instruction.arguments.append(int(arg_text))
-        elif required == ArgumentType.SYMB and arg_type == "nil" and arg_text == "nil":
-            instruction.arguments.append(None)
-        else:
-            throw_error("Input source file has unknown structure [7]", 32)
+    return instruction
 
-    # Labels need to be unique
-    if instruction.name == "LABEL":
-        if arg_text in labels:
-            throw_error(f"Label '{arg_text}' already exists", 52)
+# Check that root element of XML representation describes IPPcode21 program
+def check_root(root):
+    if root.tag != "program" or "language" not in root.attrib or root.attrib["language"].lower() != "ippcode21":
+        throw_error(f"Input source file has unknown structure [1]", 32)
 
-        labels[arg_text] = len(instructions)
+# Read program from XML representation generated by parse.php, instructions are yielded sorted by their order
+def read_xml(source):
+    # Parse input source file and check if it is well-formed
+    try:
+        file_parsed = ElementTree.parse(source)
+    except:
+        throw_error(f"Input source file is not well-formed", 31)
 
-    instructions.append(instruction)
+    root = file_parsed.getroot()
+    check_root(root)
 
-# Check if jumping instructions refer to existing label
-for instruction in instructions:
-    if instruction.name == "CALL" or instruction.name == "JUMP" or instruction.name == "JUMPIFEQ" or instruction.name == "JUMPIFNEQ":
-        if instruction.arguments[0] not in labels:
-            throw_error(f"Undefined label {instruction.arguments[0]}", 52)
+    # Save last parsed order of instruction so we can check there are no instructions with same order
+    last_order = 0
+
+    instruction_elements = sorted(root, key=lambda x: int(x.attrib["order"]) if "order" in x.attrib and x.attrib["order"].isdigit() else 0)
+    for elem_instruction in instruction_elements:
+        instruction = decode_instruction(elem_instruction)
+
+        # Order needs to be bigger than 0 and there can't be two instructions with same order
+        if instruction.order < 1 or instruction.order == last_order:
+            throw_error(f"Input source file has unknown structure [3]", 32)
+
+        last_order = instruction.order
+
+        yield instruction
+
+# Read XML representation while it is still arriving, every instruction is yielded as soon as its element is closed
+def stream_xml(source):
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+
+    # Feed parser with data, None closes the document
+    def read_events(data):
+        try:
+            if data != None:
+                parser.feed(data)
+            else:
+                parser.close()
+
+            return list(parser.read_events())
+        except ElementTree.ParseError:
+            throw_error(f"Input source file is not well-formed", 31)
+
+    # Depth of currently parsed element, root element has depth 1
+    depth = 0
+    root = None
+
+    # Instructions can't be sorted before they are executed, so they have to arrive with increasing order
+    last_order = 0
+
+    for data in itertools.chain(source, [None]):
+        for event, element in read_events(data):
+            if event == "start":
+                depth = depth + 1
+
+                if depth == 1:
+                    root = element
+                    check_root(root)
+                continue
+
+            depth = depth - 1
+
+            if depth != 1:
+                continue
+
+            instruction = decode_instruction(element)
+
+            # Instructions can not be sorted before execution, instructions loaded before out of order one may have been executed already
+            if instruction.order <= last_order:
+                throw_error(f"Input source file has unknown structure [3]", 32)
+
+            last_order = instruction.order
+
+            # Element is not needed anymore, so whole document is never kept in memory
+            root.remove(element)
+
+            yield instruction
+
+# Read program directly from IPPcode21 source code, lexical rules match the XML representation and error codes match parse.php
+def read_text(source):
+    # Was header found?
+    header = False
+
+    # Order of last parsed instruction
+    order = 0
+
+    try:
+        for line_i, line in enumerate(source, 1):
+            # Remove comment and split the rest of line to tokens
+            data = line.split("#", 1)[0].split()
+
+            # Line does not contain instruction, we can skip
+            if len(data) == 0:
+                continue
+
+            # If we didn't parse header yet, the next non-empty line has to be the header
+            if not header:
+                if data[0].upper() != ".IPPCODE21":
+                    throw_error("Missing header", 21)
+
+                header = True
+                continue
+
+            order = order + 1
+            instruction = Instruction(data[0].upper(), order)
+
+            if instruction.name not in instruction_table:
+                throw_error(f"Undefined instruction {instruction.name}", 22)
+
+            if len(data) - 1 != len(instruction_table[instruction.name]):
+                throw_error(f"Incorrect number of arguments in instruction on line {line_i}", 23)
+
+            for required, value in zip(instruction_table[instruction.name], data[1:]):
+                # Symbol carries its type as prefix, other arguments are determined by the instruction table
+                if required == ArgumentType.SYMB:
+                    if "@" not in value:
+                        throw_error(f"Syntax error on line {line_i}", 23)
+
+                    arg_type, arg_text = value.split("@", 1)
+
+                    if arg_type == "GF" or arg_type == "LF" or arg_type == "TF":
+                        arg_type, arg_text = "var", value
+                elif required == ArgumentType.VAR:
+                    arg_type, arg_text = "var", value
+                elif required == ArgumentType.LABEL:
+                    arg_type, arg_text = "label", value
+                elif required == ArgumentType.TYPE:
+                    arg_type, arg_text = "type", value
+
+                instruction.arguments.append(decode_argument(required, arg_type, arg_text, f"Syntax error on line {line_i}", 23))
+
+            yield instruction
+    except UnicodeDecodeError:
+        throw_error(f"Input source file is not valid UTF-8", 23)
+
+    if not header:
+        throw_error("Missing header", 21)
+
+# Loads instructions from reader, in pipelined mode only as far as the execution needs them
+class Loader:
+    def __init__(self, reader):
+        self.reader = reader       # Generator of instructions
+        self.finished = False      # Was the whole program loaded
+
+    # Load next instruction, returns False if there are no more instructions
+    def load_next(self):
+        try:
+            add_instruction(next(self.reader))
+        except StopIteration:
+            self.finished = True
+
+        return not self.finished
+
+    # Load instructions until instruction on provided index is available, returns False if program is shorter
+    def load(self, index):
+        while len(instructions) <= index and self.load_next():
+            pass
+
+        return len(instructions) > index
+
+    # Load instructions until provided label is defined
+    def load_label(self, name):
+        while name not in labels and self.load_next():
+            pass
+
+    def load_all(self):
+        while self.load_next():
+            pass
+
+if source_format == "text":
+    reader = read_text(open(file_source, "r", encoding="utf-8") if file_source else sys.stdin)
+elif pipeline:
+    reader = stream_xml(open(file_source, "rb") if file_source else sys.stdin.buffer)
+else:
+    reader = read_xml(file_source if file_source else sys.stdin)
+
+loader = Loader(reader)
+
+# Without pipelined loading whole program is loaded and checked before it is executed
+if not pipeline:
+    loader.load_all()
+
+    # Check if jumping instructions refer to existing label
+    for instruction in instructions:
+        if instruction.name == "CALL" or instruction.name == "JUMP" or instruction.name == "JUMPIFEQ" or instruction.name == "JUMPIFNEQ":
+            if instruction.arguments[0] not in labels:
+                throw_error(f"Undefined label {instruction.arguments[0]}", 52)
+
+# Redirect input file to stdin if provided
+if file_input:
+    sys.stdin = open(file_input, "r")
+
+# Get position of label, in pipelined mode program is loaded until the label is defined
+def get_label(name):
+    if name not in labels:
+        loader.load_label(name)
+
+        if name not in labels:
+            throw_error(f"Undefined label {name}", 52)
+
+    return labels[name]
+
+# Only decode provided trace file, program is not executed
+if file_trace_decode != None:
+    Trace.decode(file_trace_decode, instructions, debug)
+    sys.exit(0)
+
+# Trace is written even if interpret exits because of an error
+trace = None
+if file_trace != None:
+    trace = Trace(file_trace, trace_size if trace_size != None else 1048576, trace_values, debug)
+    atexit.register(trace.close)
 
 # Class representing memory, providing wrapper for manipulation with variables and handling frames
 class Memory:
@@ -292,8 +750,62 @@ class Memory:
     # Stack of local frames
     frame_local = []
 
+    # Bytes taken by strings stored in variables and by values on data stack
+    string_bytes = 0
+    data_bytes = 0
+    # Largest values reached by memory statistics
+    peak_string_bytes = 0
+    peak_frame_local = 0
+    largest_value = 0
+    # Maximum number of bytes that strings in variables and data stack can take
+    limit = None
+
+    # Number of bytes taken by content of value, strings are measured in UTF-8
+    def value_size(self, value):
+        if type(value) == str:
+            return len(value) if value.isascii() else len(value.encode())
+        elif type(value) == int:
+            return value.bit_length() // 8 + 1
+        elif type(value) == float:
+            return 8
+        elif type(value) == bool:
+            return 1
+
+        return 0
+
+    # Save size of new value and check that memory limit was not exceeded
+    def account_value(self, size):
+        if size > self.largest_value:
+            self.largest_value = size
+
+        if self.string_bytes > self.peak_string_bytes:
+            self.peak_string_bytes = self.string_bytes
+
+        if self.limit != None and self.string_bytes + self.data_bytes > self.limit:
+            throw_error(f"Memory limit of {self.limit} bytes exceeded", 59)
+
+    # Release strings stored in frame that is being discarded
+    def drop_frame(self, frame):
+        if accounting and frame != None:
+            self.string_bytes = self.string_bytes - sum(self.value_size(x) for x in frame.values() if type(x) == str)
+
+    # Value was pushed to data stack
+    def push_data(self, value):
+        if not accounting:
+            return
+
+        size = self.value_size(value)
+        self.data_bytes = self.data_bytes + size
+        self.account_value(size)
+
+    # Value was popped from data stack
+    def pop_data(self, value):
+        if accounting:
+            self.data_bytes = self.data_bytes - self.value_size(value)
+
     # Create/overwrite temporary frame
     def create_frame(self):
+        self.drop_frame(self.frame_temporary)
         self.frame_temporary = {}
 
     # Push temporary frame to stack of local frames
@@ -303,12 +815,16 @@ class Memory:
 
         self.frame_local.append(self.frame_temporary)
         self.frame_temporary = None
+
+        if len(self.frame_local) > self.peak_frame_local:
+            self.peak_frame_local = len(self.frame_local)
     
     # Pop top of local frames stack into temporary frame
     def pop_frame(self):
         if len(self.frame_local) == 0:
             throw_error("There is no local frame to pop", 55)
 
+        self.drop_frame(self.frame_temporary)
         self.frame_temporary = self.frame_local.pop()
 
     # Get coresponding frame of variable
@@ -342,6 +858,16 @@ class Memory:
         if var.name not in frame:
             throw_error(f"Trying to access variable '{var.name}' that does not exist in frame '{var.frame}'", 54)
 
+        if accounting:
+            if type(frame[var.name]) == str:
+                self.string_bytes = self.string_bytes - self.value_size(frame[var.name])
+
+            size = self.value_size(value)
+            if type(value) == str:
+                self.string_bytes = self.string_bytes + size
+
+            self.account_value(size)
+
         frame[var.name] = value
 
     # Get variable instance
@@ -377,6 +903,10 @@ class Memory:
         return total
 
 memory = Memory()
+memory.limit = max_memory
+
+# Sizes of values are tracked only if some stat or memory limit needs them
+accounting = max_memory != None or "strings" in stats or "largest" in stats
 
 # Semantic analysis of provided arguments
 def validate_arguments(instruction: Instruction, types, equals=True, throw=True):
@@ -401,12 +931,24 @@ def validate_arguments(instruction: Instruction, types, equals=True, throw=True)
     
     return True
 
+# Specialize instruction for types of its operands, next execution then only checks that the types did not change
+def quicken(instruction: Instruction):
+    first = type(memory.get_value(instruction.arguments[1]))
+    second = type(memory.get_value(instruction.arguments[2]))
+
+    if first is second and first in quickening_table[instruction.name][0]:
+        instruction.quick = (first, quickening_table[instruction.name][1])
+
 # Total number of called instructions
 total = 0
 
 # Maximum number of initialized variables
 max_var = 0
 
+# Maximum depth of call and data stack
+max_call_stack = 0
+max_data_stack = 0
+
 # What instruction is interpret on
 index = 0
 
@@ -414,10 +956,40 @@ index = 0
 call_stack = []
 data_stack = []
 
+# Print state of interpret to stderr, used by BREAK instruction
+def dump_state(instruction: Instruction):
+    # Value in IPPcode21 notation
+    def describe(value):
+        if type(value) == type(VarState.UNDEFINED):
+            return "(undefined)"
+        elif type(value) == bool:
+            return f"bool@{value_to_string(value)}"
+        elif type(value) == int:
+            return f"int@{value}"
+        elif type(value) == float:
+            return f"float@{value_to_string(value)}"
+        elif type(value) == str:
+            return f"string@{value}"
+        return "nil@nil"
+
+    def describe_frame(frame):
+        return "{" + ", ".join(f"{name} = {describe(value)}" for name, value in frame.items()) + "}"
+
+    print(f"Instruction: {index} (order {instruction.order})", file=sys.stderr)
+    print(f"Executed instructions: {total}", file=sys.stderr)
+    print(f"Global frame: {describe_frame(memory.frame_global)}", file=sys.stderr)
+    print(f"Temporary frame: {describe_frame(memory.frame_temporary) if memory.frame_temporary != None else '(undefined)'}", file=sys.stderr)
+    print(f"Local frames: [{', '.join(describe_frame(frame) for frame in memory.frame_local)}]", file=sys.stderr)
+    print(f"Data stack: [{', '.join(describe(value) for value in data_stack)}]", file=sys.stderr)
+    print(f"Call stack: [{', '.join(str(instructions[i].order) for i in call_stack)}]", file=sys.stderr)
+
 # Return code that will interpret exit with
 return_code = 0
-while True:
-    if(index >= len(instructions)):
+
+# Is interpret running, EXIT instruction stops it without loading the rest of program
+running = True
+while running:
+    if index >= len(instructions) and not loader.load(index):
         break
 
     # Check how many variables are initialized and save if it is largest number so far
@@ -427,8 +999,31 @@ while True:
     
     instruction = instructions[index]
 
+    if trace != None:
+        trace.record(index)
+
+    # Guard of quickened instruction, if operand types changed instruction goes back to generic implementation
+    quick = instruction.quick
+    if quick != None:
+        first = memory.get_value(instruction.arguments[1])
+        second = memory.get_value(instruction.arguments[2])
+
+        if type(first) is not quick[0] or type(second) is not quick[0]:
+            instruction.quick = quick = None
+
+    # Quickened instructions
+    if quick != None:
+        if instruction.name == "JUMPIFEQ" or instruction.name == "JUMPIFNEQ":
+            if quick[1](first, second):
+                index = get_label(instruction.arguments[0])
+
+                if trace != None:
+                    trace.taken()
+        else:
+            memory.set_variable(instruction.arguments[0], quick[1](first, second))
+
     # Frame and function related instructions
-    if instruction.name == "MOVE":
+    elif instruction.name == "MOVE":
         memory.set_variable(instruction.arguments[0], memory.get_value(instruction.arguments[1]))
     elif instruction.name == "CREATEFRAME":
         memory.create_frame()
@@ -440,7 +1035,10 @@ while True:
         memory.def_variable(instruction.arguments[0])
     elif instruction.name == "CALL":
         call_stack.append(index)
-        index = labels[instruction.arguments[0]]
+        index = get_label(instruction.arguments[0])
+
+        if len(call_stack) > max_call_stack:
+            max_call_stack = len(call_stack)
     elif instruction.name == "RETURN":
         if len(call_stack) == 0:
             throw_error(f"Call stack is empty", 56)
@@ -450,21 +1048,32 @@ while True:
     # Data stack related instructions
     elif instruction.name == "PUSHS":
         data_stack.append(memory.get_value(instruction.arguments[0]))
+        memory.push_data(data_stack[-1])
+
+        if len(data_stack) > max_data_stack:
+            max_data_stack = len(data_stack)
     elif instruction.name == "POPS":
         if len(data_stack) == 0:
             throw_error(f"Data stack is empty", 56)
 
+        memory.pop_data(data_stack[-1])
         memory.set_variable(instruction.arguments[0], data_stack.pop())
 
     # Arithmetic, relational, boolean and conversion instructions
     elif instruction.name == "ADD":
         validate_arguments(instruction, {1: [int, float], 2: [int, float]})
+        if quickening:
+            quicken(instruction)
         memory.set_variable(instruction.arguments[0], memory.get_value(instruction.arguments[1]) + memory.get_value(instruction.arguments[2]))
     elif instruction.name == "SUB":
         validate_arguments(instruction, {1: [int, float], 2: [int, float]})
+        if quickening:
+            quicken(instruction)
         memory.set_variable(instruction.arguments[0], memory.get_value(instruction.arguments[1]) - memory.get_value(instruction.arguments[2]))
     elif instruction.name == "MUL":
         validate_arguments(instruction, {1: [int, float], 2: [int, float]})
+        if quickening:
+            quicken(instruction)
         memory.set_variable(instruction.arguments[0], memory.get_value(instruction.arguments[1]) * memory.get_value(instruction.arguments[2]))
     elif instruction.name == "IDIV":
         validate_arguments(instruction, {1: [int], 2: [int]})
@@ -482,9 +1091,13 @@ while True:
         memory.set_variable(instruction.arguments[0], memory.get_value(instruction.arguments[1]) / memory.get_value(instruction.arguments[2]))
     elif instruction.name == "LT":
         validate_arguments(instruction, {1: [int, bool, str, float], 2: [int, bool, str, float]})
+        if quickening:
+            quicken(instruction)
         memory.set_variable(instruction.arguments[0], memory.get_value(instruction.arguments[1]) < memory.get_value(instruction.arguments[2]))
     elif instruction.name == "GT":
         validate_arguments(instruction, {1: [int, bool, str, float], 2: [int, bool, str, float]})
+        if quickening:
+            quicken(instruction)
         memory.set_variable(instruction.arguments[0], memory.get_value(instruction.arguments[1]) > memory.get_value(instruction.arguments[2]))
     elif instruction.name == "EQ":
         option1 = validate_arguments(instruction, {1: [int, bool, str, float, type(None)], 2: [int, bool, str, float, type(None)]}, True, False)
@@ -494,6 +1107,9 @@ while True:
         if not option1 and not option2 and not option3:
             throw_error(f"Incorrect operand types in instruction {instruction.name}", 53)
 
+        if quickening:
+            quicken(instruction)
+
         memory.set_variable(instruction.arguments[0], memory.get_value(instruction.arguments[1]) == memory.get_value(instruction.arguments[2]))
     elif instruction.name == "AND":
         validate_arguments(instruction, {1: [bool], 2: [bool]})
@@ -553,22 +1169,13 @@ while True:
             memory.set_variable(instruction.arguments[0], None)
             
     elif instruction.name == "WRITE":
-        value = memory.get_value(instruction.arguments[0])
-
-        if value == None:
-            value = ""
-        
-        if type(value) == bool:
-            value = "true" if value else "false"
-
-        if type(value) == float:
-            value = float.hex(value)
-
-        print(value, end ="")
+        print(value_to_string(memory.get_value(instruction.arguments[0])), end ="")
 
     # String related instructions 
     elif instruction.name == "CONCAT":
         validate_arguments(instruction, {1: [str], 2: [str]})
+        if quickening:
+            quicken(instruction)
         memory.set_variable(instruction.arguments[0], memory.get_value(instruction.arguments[1]) + memory.get_value(instruction.arguments[2]))
     elif instruction.name == "STRLEN":
         validate_arguments(instruction, {1: [str]})
@@ -621,7 +1228,7 @@ while True:
     elif instruction.name == "LABEL":
         pass
     elif instruction.name == "JUMP":
-        index = labels[instruction.arguments[0]]
+        index = get_label(instruction.arguments[0])
     elif instruction.name == "JUMPIFEQ":
         option1 = validate_arguments(instruction, {1: [int, bool, str, float, type(None)], 2: [int, bool, str, float, type(None)]}, True, False)
         option2 = validate_arguments(instruction, {1: [type(None)], 2: [int, bool, str, float]}, False, False)
@@ -630,8 +1237,14 @@ while True:
         if not option1 and not option2 and not option3:
             throw_error(f"Incorrect operand types in instruction {instruction.name}", 53)
 
+        if quickening:
+            quicken(instruction)
+
         if memory.get_value(instruction.arguments[1]) == memory.get_value(instruction.arguments[2]):
-            index = labels[instruction.arguments[0]]
+            index = get_label(instruction.arguments[0])
+
+            if trace != None:
+                trace.taken()
     elif instruction.name == "JUMPIFNEQ":
         option1 = validate_arguments(instruction, {1: [int, bool, str, float, type(None)], 2: [int, bool, str, float, type(None)]}, True, False)
         option2 = validate_arguments(instruction, {1: [type(None)], 2: [int, bool, str, float]}, False, False)
@@ -640,8 +1253,14 @@ while True:
         if not option1 and not option2 and not option3:
             throw_error(f"Incorrect operand types in instruction {instruction.name}", 53)
 
+        if quickening:
+            quicken(instruction)
+
         if memory.get_value(instruction.arguments[1]) != memory.get_value(instruction.arguments[2]):
-            index = labels[instruction.arguments[0]]
+            index = get_label(instruction.arguments[0])
+
+            if trace != None:
+                trace.taken()
     elif instruction.name == "EXIT":
         validate_arguments(instruction, {0: [int]})
 
@@ -650,14 +1269,17 @@ while True:
         if return_code < 0 or return_code > 49:
             throw_error(f"Invalid exit code, only range 0-49 is supported", 57)
 
-        index = len(instructions) + 1
+        running = False
     
     # Debug instructions
     elif instruction.name == "DPRINT":
-        #print(memory.get_value(instruction.arguments[0]), file=sys.stderr)
-        pass
+        print(value_to_string(memory.get_value(instruction.arguments[0])), end ="", file=sys.stderr)
     elif instruction.name == "BREAK":
-        pass
+        dump_state(instruction)
+
+    # Save value written to variable by instruction
+    if trace != None and trace.values and len(instruction_table[instruction.name]) > 0 and instruction_table[instruction.name][0] == ArgumentType.VAR:
+        trace.value(memory.get_variable(instruction.arguments[0], False))
 
     # Increment total instructions called
     if instruction.name != "LABEL" and instruction.name != "DPRINT" and instruction.name != "BREAK":
@@ -688,6 +1310,16 @@ if file_stats != None:
             file.write(f"{hot_instruction.order if hot_instruction != None else 0}\n")
         elif stat_name == "vars":
             file.write(f"{max_var}\n")
+        elif stat_name == "stack":
+            file.write(f"{max_data_stack}\n")
+        elif stat_name == "calls":
+            file.write(f"{max_call_stack}\n")
+        elif stat_name == "frames":
+            file.write(f"{memory.peak_frame_local}\n")
+        elif stat_name == "strings":
+            file.write(f"{memory.peak_string_bytes}\n")
+        elif stat_name == "largest":
+            file.write(f"{memory.largest_value}\n")
 
     file.close()
 
@@ -23,7 +23,9 @@ $arguments = [
     "jexamxml" => false,
     "jexamcfg" => false,
     "testlist" => false,
-    "match" => false
+    "match" => false,
+    "cache" => false,
+    "no-cache" => false
 ];
 
 array_shift($argv);
@@ -44,6 +46,10 @@ foreach($argv as $arg) {
         $arguments["testlist"] = $matches[1];
     } else if(preg_match("/^--match=(\S+)$/", $arg, $matches) && @preg_match($matches[1], null) !== false) {
         $arguments["match"] = $matches[1];
+    } else if(preg_match("/^--cache=(\S+)$/", $arg, $matches)) {
+        $arguments["cache"] = $matches[1];
+    } else if($arg == "--no-cache") {
+        $arguments["no-cache"] = true;
     } else if($arg == "--recursive") {
         $arguments["recursive"] = true;
     } else if($arg == "--parse-only" && $arguments["int-only"] === false && $arguments["int-script"] === false) {
@@ -60,6 +66,7 @@ if($arguments["parse-script"] === false) $arguments["parse-script"] = "parse.php
 if($arguments["int-script"] === false) $arguments["int-script"] = "interpret.py";
 if($arguments["jexamxml"] === false) $arguments["jexamxml"] = "/pub/courses/ipp/jexamxml/jexamxml.jar";
 if($arguments["jexamcfg"] === false) $arguments["jexamcfg"] = "/pub/courses/ipp/jexamxml/options";
+if($arguments["cache"] === false) $arguments["cache"] = "test_cache.json";
 
 // Verify that file or directory exists
 function assert_path_exists(string $path, bool $dir = false, int $error) {
@@ -152,6 +159,46 @@ foreach($files as $file) {
     assert_file_created("${file}.rc", "0");
 }
 
+// Results of previous runs, keyed by testing mode and test path, each with hash of test files and scripts under test
+$cache = [];
+if(file_exists($arguments["cache"])) {
+    $cache = json_decode(file_get_contents($arguments["cache"]), true);
+
+    if(!is_array($cache))
+        $cache = [];
+}
+
+// Forget results of tests that were removed, so cache does not grow forever
+foreach($cache as $key => $entry) {
+    if(!is_array($entry) || !array_key_exists("file", $entry) || !array_key_exists("hash", $entry) || !file_exists($entry["file"]))
+        unset($cache[$key]);
+}
+
+// Testing mode, results of the same test in different modes are cached separately
+$mode = "both";
+if($arguments["parse-only"] === true)
+    $mode = "parse-only";
+else if($arguments["int-only"] === true)
+    $mode = "int-only";
+
+// Hash of scripts under test and of the mode they are tested in, any change invalidates cached results
+$scripts_hash = $mode;
+
+if($arguments["int-only"] === false)
+    $scripts_hash .= sha1_file($arguments["parse-script"]) . sha1_file($arguments["jexamcfg"]);
+
+// Parser output is compared by jexamxml, so its new version can change results too
+if($arguments["parse-only"] === true)
+    $scripts_hash .= sha1_file($arguments["jexamxml"]);
+
+if($arguments["parse-only"] === false)
+    $scripts_hash .= sha1_file($arguments["int-script"]);
+
+// Hash of all files of the test combined with hash of scripts under test
+function test_hash(string $file, string $scripts_hash) {
+    return sha1($scripts_hash . sha1_file("${file}.src") . sha1_file("${file}.in") . sha1_file("${file}.out") . sha1_file("${file}.rc"));
+}
+
 // List of all performed tests
 $tests = [];
 
@@ -160,11 +207,23 @@ foreach($files as $file) {
     $test = [
         "path" => dirname($file),
         "name" => basename($file),
-        "error" => false
+        "error" => false,
+        "file" => realpath("${file}.src"),
+        "hash" => test_hash($file, $scripts_hash),
+        "cached" => false
     ];
+    $test["key"] = $mode . ":" . $test["file"];
 
     //var_dump($test);
 
+    // Neither test files nor scripts changed since the last run, use its result
+    if($arguments["no-cache"] === false && array_key_exists($test["key"], $cache) && $cache[$test["key"]]["hash"] === $test["hash"]) {
+        $test["error"] = $cache[$test["key"]]["error"];
+        $test["cached"] = true;
+        $tests[] = $test;
+        continue;
+    }
+
     // Return code that we expect to get
     $expected_rc = intval(file_get_contents("${file}.rc"));
 
@@ -234,6 +293,13 @@ foreach($files as $file) {
     $tests[] = $test;
 }
 
+// Merge results of this run into cache, results of tests that were not run now are kept for the next run
+foreach($tests as $test)
+    $cache[$test["key"]] = ["file" => $test["file"], "hash" => $test["hash"], "error" => $test["error"]];
+
+if(@file_put_contents($arguments["cache"], json_encode($cache)) === false)
+    error_log("Could not write cache file ${arguments["cache"]}");
+
 // Remove temporary files if they exist
 if(file_exists("parse_tmp"))
     unlink("parse_tmp");
@@ -288,7 +354,7 @@ foreach($tests as $test) {
     $path = $element->appendChild($document->createElement("div", $test["path"]));
     $path->setAttribute("class", "path");
 
-    $error = $element->appendChild($document->createElement("div", "Result: " . ($test["error"] ? $test["error"] : "Success")));
+    $error = $element->appendChild($document->createElement("div", "Result: " . ($test["error"] ? $test["error"] : "Success") . ($test["cached"] ? " (cached)" : "")));
     $error->setAttribute("class", "error");
 
     if($test["error"] !== false) {